@@ -8,13 +8,16 @@ add custom properties, and send them back as a new version.
 from main import get_client
 from specklepy.transports.server import ServerTransport
 from specklepy.api import operations
-from specklepy.objects.base import Base
 from specklepy.core.api.inputs.version_inputs import CreateVersionInput
 
 
 PROJECT_ID = "128262a20c"
 MODEL_ID = "9884593105"
 
+# Upload tuning: bigger batches and more upload threads than the specklepy defaults (1 MB / 4)
+SEND_BATCH_SIZE_MB = 10
+SEND_THREAD_COUNT = 8
+
 
 # ----------------------------------
 # Authenticate
@@ -59,10 +62,16 @@ data["processed_by"] = "Shuai Zhang"
 # ----------------------------------
 # Find "Old modules" collection
 # ----------------------------------
-def find_collection(obj, name):
-    elements = getattr(obj, "@elements", None) or getattr(obj, "elements", [])
+def get_elements(obj):
+    # Detached "@elements" first, plain "elements" only if that is missing
+    elements = getattr(obj, "@elements", None)
+    if elements is None:
+        elements = getattr(obj, "elements", None)
+    return elements or ()
+
 
-    for el in elements or []:
+def find_collection(obj, name):
+    for el in get_elements(obj):
         if getattr(el, "name", None) == name:
             return el
 
@@ -85,13 +94,19 @@ new_designers = [
 ]
 
 if old_modules:
-    old_elements = getattr(old_modules, "@elements", None) or getattr(
-        old_modules, "elements", []
-    )
+    old_elements = get_elements(old_modules)
 
     for element, designer in zip(old_elements, new_designers):
-        if isinstance(element, Base) and "properties" in element.get_member_names():
-            element["properties"]["Designer"] = designer
+        # Single attribute lookup instead of scanning get_member_names();
+        # elements without "properties" (or that are not Base objects) are skipped
+        try:
+            props = element.properties
+        except AttributeError:
+            continue
+        if props is None:
+            continue
+
+        props["Designer"] = designer
 
     print("✓ Updated Designer names in 'Old modules' collection.")
 
@@ -99,7 +114,17 @@ if old_modules:
 # ----------------------------------
 # Send the modified data back
 # ----------------------------------
-object_id = operations.send(data, [transport])
+# ServerTransport has no options for this, so tune its batch sender directly (if present)
+batch_sender = getattr(transport, "_batch_sender", None)
+if batch_sender is not None:
+    batch_sender.max_size = int(SEND_BATCH_SIZE_MB * 1000 * 1000)
+    batch_sender.thread_count = SEND_THREAD_COUNT
+
+# Objects are content-addressed: the server transport diffs every batch against
+# the server and only uploads children it does not have yet, so unchanged
+# elements are not re-uploaded. Skip the default local cache, which would
+# otherwise write every object to the local SQLite cache as well.
+object_id = operations.send(data, [transport], use_default_cache=False)
 print(f"✓ Sent object: {object_id}")
 
 
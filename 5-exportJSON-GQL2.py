@@ -5,10 +5,10 @@ This script connects to Speckle's GraphQL API and fetches object data
 from a specified project and object ID, then saves it to a JSON file.
 """
 
-import json
 import os
-from main import get_client
-from gql import gql
+from main import get_client, get_http_session
+from backup_io import write_json
+from speckle_batch import build_objects_query, split_objects_result
 
 
 # TODO: Replace with your project and object IDs
@@ -16,38 +16,32 @@ PROJECT_ID = "128262a20c"
 OBJECT_ID = "cae9cccc231d4fc7c7331c1c9d15696a"
 
 
-def query_object_data_graphql(client, project_id: str, object_id: str) -> dict:
+def query_objects(client, project_id: str, object_ids: list[str]) -> dict:
     """
-    Query object data from Speckle using GraphQL API.
+    Query the data of one or more objects from Speckle using GraphQL API.
+    All objects are fetched in a single request (one aliased field per object).
     
     Args:
         client: Authenticated SpeckleClient instance
         project_id: The Speckle project ID
-        object_id: The Speckle object ID
+        object_ids: The Speckle object IDs
     
     Returns:
-        Dictionary containing the query result
+        Dictionary of {object_id: data} (empty if object_ids is empty)
     """
-    query = gql("""
-    query GetObjectDataJSON($objectId: String!, $projectId: String!) {
-        project(id: $projectId) {
-            object(id: $objectId) {
-                id
-                speckleType
-                data
-            }
-        }
-    }
-    """)
+    if not object_ids:
+        return {}
+
+    query, variables = build_objects_query(project_id, object_ids)
     
-    variables = {
-        "projectId": project_id,
-        "objectId": object_id
-    }
+    # Execute GraphQL query using the client's persistent HTTP session
+    result = get_http_session(client).execute(query, variable_values=variables)
     
-    # Execute GraphQL query using the client's HTTP session
-    result = client.httpclient.execute(query, variable_values=variables)
-    return result
+    objects = split_objects_result(result, object_ids)
+    return {
+        object_id: (obj or {}).get("data")
+        for object_id, obj in objects.items()
+    }
 
 # query 
 
@@ -61,7 +55,7 @@ def main():
     
     # Execute GraphQL query
     try:
-        graphql_result = query_object_data_graphql(client, PROJECT_ID, OBJECT_ID)
+        objects_data = query_objects(client, PROJECT_ID, [OBJECT_ID])
         print(f"✓ GraphQL query executed successfully")
     except Exception as e:
         print(f"⚠ GraphQL query failed: {e}")
@@ -71,15 +65,14 @@ def main():
     output = {
         "projectId": PROJECT_ID,
         "objectId": OBJECT_ID,
-        "data": graphql_result["project"]["object"]["data"]
+        "data": objects_data[OBJECT_ID]
     }
     
     # Save to JSON file in the same directory as this script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     output_file = os.path.join(script_dir, "object_data.json")
     
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, default=str)
+    write_json(output_file, output)
     
     print(f"✓ Saved object data to {output_file}")
 
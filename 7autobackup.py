@@ -1,20 +1,35 @@
 import asyncio
-import json
 import os
-import datetime
+from functools import partial
+import aiohttp
 from dotenv import load_dotenv
 
 # GraphQL Imports
 from gql import gql, Client
-from gql.transport.websockets import WebsocketsTransport
 from gql.transport.aiohttp import AIOHTTPTransport
 
+from backup_io import (
+    write_backup, make_backup_path, reuse_existing_backup, parse_backup_args,
+    load_backup_index, save_backup_index,
+)
+from speckle_batch import build_objects_query, split_objects_result, batch_worker, finish_batches, stop_on_sigint
+from speckle_ws import get_server_host, subscribe, close_session
+
 # --- CONFIGURATION ---
 load_dotenv()
 SPECKLE_TOKEN = os.environ.get("SPECKLE_TOKEN")
-SPECKLE_SERVER = "app.speckle.systems"  # Change if using a custom server
+SPECKLE_SERVER = get_server_host()  # From SPECKLE_SERVER in .env (defaults to app.speckle.systems)
 PROJECT_ID = "128262a20c"    
 OBJECT_ID = "cae9cccc231d4fc7c7331c1c9d15696a"           # REPLACE with your Project ID
+MAX_CONCURRENT_BACKUPS = 4   # Backups downloaded/written in parallel
+BACKUP_FORMAT = "msgpack"    # "msgpack" or "json" (override with --format)
+COMPRESS = True              # zstd-compress backups (disable with --no-compress)
+JSON_INDENT = None           # None = compact JSON unless BACKUP_INDENT is set (see --pretty)
+BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups")
+INDEX_FILE = os.path.join(BACKUP_DIR, ".backup_index.json")
+
+# referencedObject is a content hash: object_id -> path of a backup that already holds its data
+already_backed_up = {}
 
 if not SPECKLE_TOKEN:
     raise ValueError("❌ Please set SPECKLE_TOKEN in your environment variables or .env file.")
@@ -37,93 +52,143 @@ SUB_PROJECT_UPDATES = gql("""
 """)
 
 # 2. Query: Fetch the actual object data (The "Backup" part)
-QUERY_OBJECT_DATA = gql("""
-    query GetObjectData($projectId: String!, $objectId: String!) {
-        project(id: $projectId) {
-            object(id: $objectId) {
-                id
-                speckleType
-                data
-            }
-        }
-    }
-""")
+#    Built per batch with build_objects_query(), one aliased object() field per version.
 
 # --- HELPER FUNCTIONS ---
 
-async def fetch_and_save_data(version_id, object_id, message):
+def make_version_backup_path(version_id, message):
     """
-    Connects via HTTP to fetch the object data and saves it to a JSON file.
+    Builds the timestamped backup file path for a version.
     """
-    print(f"   ⏳ Starting backup for Object: {object_id}...")
+    return make_backup_path(BACKUP_DIR, version_id, BACKUP_FORMAT, COMPRESS, message or "")
 
-    # Set up HTTP Transport for the standard query (WebSockets is for subs only)
-    transport = AIOHTTPTransport(
-        url=f"https://{SPECKLE_SERVER}/graphql",
-        headers={"Authorization": f"Bearer {SPECKLE_TOKEN}"}
-    )
+async def save_object_data(version_id, object_id, message, obj):
+    """
+    Saves the data of one fetched object to a backup file.
+    """
+    # Extract data
+    obj_data = (obj or {}).get("data")
 
-    async with Client(transport=transport, fetch_schema_from_transport=False) as session:
-        try:
-            # Execute the query
-            result = await session.execute(
-                QUERY_OBJECT_DATA, 
-                variable_values={"projectId": PROJECT_ID, "objectId": object_id}
-            )
-            
-            # Extract data
-            obj_data = result.get("project", {}).get("object", {}).get("data")
-            
-            if not obj_data:
-                print("   ⚠️  No data found for this object.")
-                return
-
-            # Create a filename with timestamp and version ID
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            clean_msg = "".join(c for c in message if c.isalnum() or c in (' ', '_')).rstrip()
-            filename = f"backup_{timestamp}_{version_id}_{clean_msg[:20]}.json"
-            
-            # Ensure backup directory exists
-            backup_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups")
-            os.makedirs(backup_dir, exist_ok=True)
-            filepath = os.path.join(backup_dir, filename)
-
-            # Write to disk
-            output = {
-                "projectId": PROJECT_ID,
-                "versionId": version_id,
-                "objectId": object_id,
-                "backupTime": timestamp,
-                "data": obj_data
-            }
+    if not obj_data:
+        print(f"   ⚠️  No data found for object {object_id}.")
+        return
+
+    try:
+        timestamp, filepath = make_version_backup_path(version_id, message)
+
+        # Write to disk (metadata first, then the object data streamed key by key)
+        meta = {
+            "projectId": PROJECT_ID,
+            "versionId": version_id,
+            "objectId": object_id,
+            "backupTime": timestamp,
+        }
+
+        # Serialize and write in a worker thread so the event loop keeps receiving events
+        await asyncio.to_thread(
+            write_backup, filepath, meta, obj_data,
+            fmt=BACKUP_FORMAT, compress=COMPRESS, indent=JSON_INDENT,
+        )
+        already_backed_up[object_id] = filepath
 
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(output, f, indent=2, default=str)
+        print(f"   ✅ Backup saved: {os.path.basename(filepath)}")
 
-            print(f"   ✅ Backup saved: {filename}")
+    except Exception as e:
+        print(f"   ❌ Failed to save backup for {object_id}: {e}")
 
+async def fetch_objects(http_session, object_ids):
+    """
+    Fetches several objects in one aliased query over the shared HTTP session.
+    If that query fails (e.g. one object is missing or forbidden), each object
+    is fetched on its own, so one bad object does not cost the others their backup.
+    Returns {object_id: object}; objects that could not be fetched are None.
+    """
+    query, variables = build_objects_query(PROJECT_ID, object_ids)
+    try:
+        result = await http_session.execute(query, variable_values=variables)
+        return split_objects_result(result, object_ids)
+    except Exception as e:
+        if len(set(object_ids)) == 1:
+            raise
+        print(f"   ⚠️  Batch download failed ({e}), retrying object by object...")
+
+    async def fetch_one(object_id):
+        try:
+            return await fetch_objects(http_session, [object_id])
         except Exception as e:
-            print(f"   ❌ Failed to download data: {e}")
+            print(f"   ❌ Failed to download {object_id}: {e}")
+            return {object_id: None}
+
+    objects = {}
+    for result in await asyncio.gather(*map(fetch_one, dict.fromkeys(object_ids))):
+        objects.update(result)
+    return objects
+
+async def fetch_and_save_data(http_session, events):
+    """
+    Fetches the object data for a batch of (version_id, object_id, message) events
+    in a single query over the shared HTTP session and saves each one to a backup file.
+    Objects that were already backed up are reused without downloading them again.
+    """
+    events = [
+        (version_id, object_id, message)
+        for version_id, object_id, message in events
+        if not reuse_existing_backup(
+            already_backed_up, object_id, make_version_backup_path(version_id, message)[1]
+        )
+    ]
+    if not events:
+        return
+
+    object_ids = [object_id for _, object_id, _ in events]
+    print(f"   ⏳ Starting backup for {len(object_ids)} object(s): {', '.join(object_ids)}...")
+
+    try:
+        # Execute one aliased query for the whole batch
+        objects = await fetch_objects(http_session, object_ids)
+    except Exception as e:
+        print(f"   ❌ Failed to download data: {e}")
+        return
+
+    await asyncio.gather(*(
+        save_object_data(version_id, object_id, message, objects.get(object_id))
+        for version_id, object_id, message in events
+    ))
 
 # --- MAIN SUBSCRIPTION LOOP ---
 
 async def main():
     print(f"🔌 Connecting to Speckle at {SPECKLE_SERVER}...")
     
-    # WebSocket Transport for Subscriptions
-    transport = WebsocketsTransport(
-        url=f"wss://{SPECKLE_SERVER}/graphql",
-        init_payload={"Authorization": f"Bearer {SPECKLE_TOKEN}"}
+    # HTTP Transport for the object queries (WebSockets is for subs only).
+    # Created once and reused for every backup so the TCP/TLS connection stays open.
+    http_transport = AIOHTTPTransport(
+        url=f"https://{SPECKLE_SERVER}/graphql",
+        headers={"Authorization": f"Bearer {SPECKLE_TOKEN}"},
+        client_session_args={
+            "connector": aiohttp.TCPConnector(limit=8, keepalive_timeout=60),
+        },
     )
-
-    client = Client(transport=transport, fetch_schema_from_transport=False)
-
-    async with client as session:
-        print(f"📡 Listening for updates on Project ID: {PROJECT_ID}")
-        print("   (Press Ctrl+C to stop)\n")
+    http_client = Client(transport=http_transport, fetch_schema_from_transport=False)
+
+    async with http_client as http_session:
+        # Events are queued here and fetched in batches by the worker
+        queue = asyncio.Queue()
+        tasks = set()
+        already_backed_up.update(load_backup_index(INDEX_FILE))
+        # Each batch runs as its own task (at most MAX_CONCURRENT_BACKUPS at a time),
+        # so a slow download never holds up the next batch
+        worker = asyncio.create_task(batch_worker(
+            queue, partial(fetch_and_save_data, http_session), tasks,
+            max_concurrent=MAX_CONCURRENT_BACKUPS,
+        ))
 
         try:
-            async for result in session.subscribe(
+            print(f"📡 Listening for updates on Project ID: {PROJECT_ID}")
+            print("   (Press Ctrl+C to stop)\n")
+
+            # Shared WebSocket session for Subscriptions (reconnects automatically)
+            async for result in subscribe(
                 SUB_PROJECT_UPDATES, 
                 variable_values={"projectId": PROJECT_ID}
             ):
@@ -142,9 +207,9 @@ async def main():
                     print(f"   Message: {msg}")
                     print(f"   Object ID: {obj_id}")
 
-                    # Trigger the backup
+                    # Queue the backup (fetched in batches by the worker)
                     if obj_id:
-                        await fetch_and_save_data(v_id, obj_id, msg)
+                        queue.put_nowait((v_id, obj_id, msg))
                     else:
                         print("   ⚠️  Could not find referencedObject ID in payload.")
                     print("=" * 60 + "\n")
@@ -153,9 +218,21 @@ async def main():
             print("\n👋 Subscription cancelled.")
         except Exception as e:
             print(f"\n❌ Connection Error: {e}")
+        finally:
+            # Back up the events still queued and let running backups finish
+            # before the HTTP session is closed
+            await finish_batches(queue, worker, tasks)
+            # Remember what was backed up for the next run
+            if already_backed_up:
+                save_backup_index(INDEX_FILE, already_backed_up)
+            await close_session()
 
 if __name__ == "__main__":
+    args = parse_backup_args("Automatically back up new Speckle versions.", BACKUP_FORMAT)
+    BACKUP_FORMAT, COMPRESS, JSON_INDENT = args.format, args.compress, args.indent
+
     try:
-        asyncio.run(main())
+        # Ctrl+C cancels main() only, so queued backups are still finished
+        asyncio.run(stop_on_sigint(main()))
     except KeyboardInterrupt:
         print("\n👋 Backup service stopped.")
\ No newline at end of file
@@ -7,92 +7,131 @@ This script merges the functionality of:
 """
 
 import asyncio
-import json
 import os
-import datetime
-from dotenv import load_dotenv
+from functools import partial
 
 # GraphQL Imports
-from gql import gql, Client
-from gql.transport.websockets import WebsocketsTransport
+from gql import gql
 
 # Import get_client from your original main.py file
 # Make sure main.py is in the same directory
-from main import get_client 
+from main import get_client, get_http_session
+from backup_io import (
+    write_backup, make_backup_path, reuse_existing_backup, parse_backup_args,
+    load_backup_index, save_backup_index,
+)
+from speckle_batch import build_objects_query, split_objects_result, batch_worker, finish_batches, stop_on_sigint
+from speckle_ws import subscribe, close_session
 
 # --- CONFIGURATION ---
-load_dotenv()
-YOUR_TOKEN = os.environ.get("SPECKLE_TOKEN")
 PROJECT_ID = "128262a20c" # Replace with your Project ID
+BACKUP_FORMAT = "msgpack" # "msgpack" or "json" (override with --format)
+COMPRESS = True           # zstd-compress backups (disable with --no-compress)
+JSON_INDENT = None        # None = compact JSON unless BACKUP_INDENT is set (see --pretty)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_FILE = os.path.join(SCRIPT_DIR, ".backup_index.json")
+
+# referencedObject is a content hash: object_id -> path of a backup that already holds its data
+already_backed_up = {}
 
 # --- PART 1: DOWNLOAD FUNCTIONALITY (From Script 1) ---
 
-def query_object_data_graphql(client, project_id: str, object_id: str) -> dict:
+def query_objects_data_graphql(client, project_id: str, object_ids) -> dict:
     """
-    Query object data from Speckle using the authenticated client.
+    Query the data of several objects from Speckle in one request
+    using the authenticated client.
+    If that request fails (e.g. one object is missing or forbidden), each
+    object is queried on its own, so one bad object does not cost the
+    others their backup.
+
+    Returns:
+        Dictionary of {object_id: object} (None for objects that could not be downloaded)
     """
-    query = gql("""
-    query GetObjectDataJSON($objectId: String!, $projectId: String!) {
-        project(id: $projectId) {
-            object(id: $objectId) {
-                id
-                speckleType
-                data
-            }
-        }
-    }
-    """)
-    
-    variables = {
-        "projectId": project_id,
-        "objectId": object_id
-    }
+    query, variables = build_objects_query(project_id, object_ids)
     
-    # Execute GraphQL query using the client's HTTP session
-    result = client.httpclient.execute(query, variable_values=variables)
-    return result
+    # Execute GraphQL query using the client's persistent HTTP session
+    try:
+        result = get_http_session(client).execute(query, variable_values=variables)
+        return split_objects_result(result, object_ids)
+    except Exception as e:
+        if len(set(object_ids)) == 1:
+            raise
+        print(f"   ⚠️  Batch download failed ({e}), retrying object by object...")
 
-def save_backup(client, project_id, object_id, version_id, message):
+    objects = {}
+    for object_id in dict.fromkeys(object_ids):
+        try:
+            objects.update(query_objects_data_graphql(client, project_id, [object_id]))
+        except Exception as e:
+            print(f"   ❌ Download failed for {object_id}: {e}")
+            objects[object_id] = None
+    return objects
+
+def make_version_backup_path(version_id):
     """
-    Orchestrates the download and saving of the JSON file.
+    Builds the timestamped backup file path for a version.
+    """
+    # Save the backup file in the same directory
+    return make_backup_path(SCRIPT_DIR, version_id, BACKUP_FORMAT, COMPRESS)
+
+def save_backup(project_id, version_id, object_id, message, data):
+    """
+    Saves the downloaded data of one object to a backup file.
     """
-    print(f"   ⬇️  Starting download for Object: {object_id}...")
-    
     try:
-        # Execute GraphQL query
-        graphql_result = query_object_data_graphql(client, project_id, object_id)
-        
-        data = graphql_result.get("project", {}).get("object", {}).get("data")
         if not data:
-            print("   ⚠️  No data found for this object.")
+            print(f"   ⚠️  No data found for object {object_id}.")
             return
 
         # Prepare filename with timestamp
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        # Clean message to be filename-safe
-        clean_msg = "".join(c for c in message if c.isalnum() or c in (' ', '_')).rstrip()
-        filename = f"backup_{timestamp}_{version_id}.json"
+        timestamp, output_file = make_version_backup_path(version_id)
         
-        # Save to JSON file in the same directory
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        output_file = os.path.join(script_dir, filename)
-        
-        output = {
+        meta = {
             "projectId": project_id,
             "versionId": version_id,
             "objectId": object_id,
             "message": message,
             "backupTimestamp": timestamp,
-            "data": data
         }
         
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(output, f, indent=2, default=str)
+        # Stream metadata and object data to disk without building one big dict
+        write_backup(output_file, meta, data, fmt=BACKUP_FORMAT, compress=COMPRESS, indent=JSON_INDENT)
+        already_backed_up[object_id] = output_file
             
-        print(f"   ✅ Backup saved successfully: {filename}")
+        print(f"   ✅ Backup saved successfully: {os.path.basename(output_file)}")
         
+    except Exception as e:
+        print(f"   ❌ Saving backup failed: {e}")
+
+def save_backups(client, project_id, events):
+    """
+    Orchestrates the download and saving of the backup files for a batch
+    of (version_id, object_id, message) events, using a single query.
+    Objects that were already backed up are reused without downloading them again.
+    """
+    events = [
+        (version_id, object_id, message)
+        for version_id, object_id, message in events
+        if not reuse_existing_backup(
+            already_backed_up, object_id, make_version_backup_path(version_id)[1]
+        )
+    ]
+    if not events:
+        return
+
+    object_ids = [object_id for _, object_id, _ in events]
+    print(f"   ⬇️  Starting download for {len(object_ids)} object(s): {', '.join(object_ids)}...")
+    
+    try:
+        # Execute GraphQL query
+        objects = query_objects_data_graphql(client, project_id, object_ids)
     except Exception as e:
         print(f"   ❌ Download failed: {e}")
+        return
+
+    for version_id, object_id, message in events:
+        obj = objects.get(object_id) or {}
+        save_backup(project_id, version_id, object_id, message, obj.get("data"))
 
 
 # --- PART 2: LISTENER FUNCTIONALITY (From Script 2) ---
@@ -122,65 +161,68 @@ async def subscribe_and_backup():
     speckle_client = get_client()
     print(f"✓ Authenticated for downloads (HTTP)")
 
-    # 2. Setup WebSocket Transport (for listening)
-    transport = WebsocketsTransport(
-        url="wss://app.speckle.systems/graphql",
-        init_payload={
-            "Authorization": f"Bearer {YOUR_TOKEN}"
-        }
-    )
-    
-    client = Client(
-        transport=transport,
-        fetch_schema_from_transport=False,
-    )
+    # Events are queued here and downloaded in batches by the worker
+    # (in a worker thread, so the event loop keeps receiving events)
+    already_backed_up.update(load_backup_index(INDEX_FILE))
+    queue = asyncio.Queue()
+    tasks = set()
+    worker = asyncio.create_task(batch_worker(
+        queue, partial(asyncio.to_thread, save_backups, speckle_client, PROJECT_ID), tasks,
+    ))
     
     try:
-        async with client as session:
-            print(f"🔌 Connected to Speckle WebSocket")
-            print(f"📡 Listening for updates on project: {PROJECT_ID}")
-            print("Press Ctrl+C to stop\n")
+        print(f"📡 Listening for updates on project: {PROJECT_ID}")
+        print("Press Ctrl+C to stop\n")
+        
+        # 2. Listen loop on the shared WebSocket session (reconnects automatically)
+        async for result in subscribe(
+            subscription_query,
+            variable_values={"projectId": PROJECT_ID}
+        ):
+            print("=" * 50)
+            print("📦 New Update Received!")
             
-            # Listen loop
-            async for result in session.subscribe(
-                subscription_query,
-                variable_values={"projectId": PROJECT_ID}
-            ):
-                print("=" * 50)
-                print("📦 New Update Received!")
-                
-                event_data = result.get("projectVersionsUpdated")
+            event_data = result.get("projectVersionsUpdated")
+            
+            if event_data:
+                event_type = event_data.get('type')
+                version = event_data.get('version')
                 
-                if event_data:
-                    event_type = event_data.get('type')
-                    version = event_data.get('version')
+                # We only care about CREATED or UPDATED events
+                if version and event_type in ['CREATED', 'UPDATED']:
+                    v_id = version.get('id')
+                    msg = version.get('message')
+                    obj_id = version.get('referencedObject') # This is the ID needed for download
                     
-                    # We only care about CREATED or UPDATED events
-                    if version and event_type in ['CREATED', 'UPDATED']:
-                        v_id = version.get('id')
-                        msg = version.get('message')
-                        obj_id = version.get('referencedObject') # This is the ID needed for download
-                        
-                        print(f"   Version ID: {v_id}")
-                        print(f"   Message: {msg}")
-                        print(f"   Ref Object: {obj_id}")
+                    print(f"   Version ID: {v_id}")
+                    print(f"   Message: {msg}")
+                    print(f"   Ref Object: {obj_id}")
+                    
+                    # ---> TRIGGER BACKUP <---
+                    if obj_id:
+                        queue.put_nowait((v_id, obj_id, msg))
+                    else:
+                        print("   ⚠️ No referenced object found in update payload.")
                         
-                        # ---> TRIGGER BACKUP <---
-                        if obj_id:
-                            # Note: Calling synchronous function inside async loop
-                            save_backup(speckle_client, PROJECT_ID, obj_id, v_id, msg)
-                        else:
-                            print("   ⚠️ No referenced object found in update payload.")
-                            
-                print("=" * 50 + "\n")
-            
+            print("=" * 50 + "\n")
+        
     except (KeyboardInterrupt, asyncio.CancelledError):
         print("\n👋 Subscription stopped by user.")
     except Exception as e:
         print(f"\n❌ Error: {e}")
     finally:
-        await transport.close()
+        # Back up the events still queued and let the running backup finish
+        # so everything is included in the index
+        await finish_batches(queue, worker, tasks)
+        # Remember what was backed up for the next run
+        if already_backed_up:
+            save_backup_index(INDEX_FILE, already_backed_up)
+        await close_session()
         print("🔌 Connection closed properly.")
 
 if __name__ == "__main__":
-    asyncio.run(subscribe_and_backup())
\ No newline at end of file
+    args = parse_backup_args("Automatically back up new Speckle versions.", BACKUP_FORMAT)
+    BACKUP_FORMAT, COMPRESS, JSON_INDENT = args.format, args.compress, args.indent
+
+    # Ctrl+C cancels subscribe_and_backup() only, so queued backups are still finished
+    asyncio.run(stop_on_sigint(subscribe_and_backup()))
\ No newline at end of file
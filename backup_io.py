@@ -0,0 +1,306 @@
+"""
+Backup I/O helpers for Speckle data.
+This module provides shared write_json() and write_backup() functions
+for the export and backup scripts, plus a small index of already backed up
+objects so unchanged objects are not downloaded again.
+
+Backups can be written as JSON or as MessagePack (smaller and faster),
+optionally compressed with zstd. JSON is written compact unless an indent
+is given (or BACKUP_INDENT is set in the environment).
+
+Usage:
+    from backup_io import write_json, write_backup
+    write_json("object_data.json", output)
+    write_backup("backup.msgpack.zst", {"versionId": version_id}, obj_data,
+                 fmt="msgpack", compress=True)
+"""
+
+import argparse
+import datetime
+import os
+import re
+import shutil
+from contextlib import nullcontext
+from functools import partial
+
+import msgpack
+import zstandard
+
+try:
+    import orjson
+except ImportError:  # Fall back to the (slower) standard library encoder
+    orjson = None
+    import json
+
+
+# Backup format -> file extension
+BACKUP_FORMATS = {
+    "json": ".json",
+    "msgpack": ".msgpack",
+}
+
+ZSTD_LEVEL = 3
+
+# Default JSON indent; 0 writes compact JSON (orjson only supports an indent of 2)
+INDENT = int(os.environ.get("BACKUP_INDENT", "0"))
+
+# Everything except letters, digits, spaces and underscores is dropped from file names
+UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9 _]+")
+
+
+def _dumps(obj, indent: int = 0) -> bytes:
+    """Encode obj as JSON bytes, compact unless indent is set."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=str, option=option)
+    if indent:
+        return json.dumps(obj, indent=indent, default=str).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def write_json(path, obj, indent: int = None):
+    """
+    Serialize obj to a JSON file at path (compact unless indent, or INDENT, is set).
+
+    Uses orjson when installed, otherwise the standard json module.
+    Non-JSON values (e.g. datetime) are converted with str().
+    """
+    if indent is None:
+        indent = INDENT
+
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(_dumps(obj, indent))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            if indent:
+                json.dump(obj, f, indent=indent, default=str)
+            else:
+                json.dump(obj, f, separators=(",", ":"), default=str)
+
+
+def backup_extension(fmt: str, compress: bool = False) -> str:
+    """
+    Return the file extension for a backup, e.g. ".msgpack" or ".json.zst".
+    """
+    return BACKUP_FORMATS[fmt] + (".zst" if compress else "")
+
+
+def write_backup(path, meta: dict, data, fmt: str = "json", compress: bool = False,
+                 indent: int = None):
+    """
+    Stream a backup file to path: the meta fields followed by a "data" field.
+
+    Instead of wrapping data in one big dict and encoding it in a single
+    pass, each top-level key of data is encoded and written on its own,
+    so only one child's encoded bytes are held in memory at a time.
+
+    fmt is one of BACKUP_FORMATS ("json" or "msgpack").
+    With compress=True the output is zstd-compressed while it is written.
+    JSON is compact unless indent (or INDENT) is set.
+    """
+    if indent is None:
+        indent = INDENT
+
+    if fmt == "msgpack":
+        write = _write_backup_msgpack
+    elif fmt == "json":
+        write = partial(_write_backup_json, indent=indent)
+    else:
+        raise ValueError(f"Unknown backup format: {fmt}")
+
+    with open(path, "wb") as f:
+        if compress:
+            writer = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f)
+        else:
+            writer = nullcontext(f)
+        with writer as w:
+            write(w, meta, data)
+
+
+def _write_backup_json(f, meta: dict, data, indent: int = 0):
+    """Write a JSON backup to the binary file f (see write_backup)."""
+    if indent:
+        step = b" " * (2 if orjson is not None else indent)
+        newline, colon = b"\n", b": "
+    else:
+        step, newline, colon = b"", b"", b":"
+
+    def entry(key, value, pad):
+        encoded = _dumps(value, indent)
+        if indent:
+            encoded = encoded.replace(b"\n", newline + pad)
+        return newline + pad + _dumps(str(key)) + colon + encoded
+
+    f.write(b"{")
+    for key, value in meta.items():
+        f.write(entry(key, value, step) + b",")
+
+    if isinstance(data, dict) and data:
+        f.write(newline + step + b'"data"' + colon)
+        separator = b"{"
+        for key, value in data.items():
+            f.write(separator + entry(key, value, step * 2))
+            separator = b","
+        f.write(newline + step + b"}")
+    else:
+        f.write(entry("data", data, step))
+
+    f.write(newline + b"}")
+
+
+def _write_backup_msgpack(f, meta: dict, data):
+    """Write a MessagePack backup to the binary file f (see write_backup)."""
+    packer = msgpack.Packer(use_bin_type=True, default=str)
+
+    f.write(packer.pack_map_header(len(meta) + 1))
+    for key, value in meta.items():
+        f.write(packer.pack(str(key)))
+        f.write(packer.pack(value))
+    f.write(packer.pack("data"))
+
+    if isinstance(data, dict):
+        f.write(packer.pack_map_header(len(data)))
+        for key, value in data.items():
+            f.write(packer.pack(key))
+            f.write(packer.pack(value))
+    else:
+        f.write(packer.pack(data))
+
+
+def make_backup_path(directory, version_id, fmt: str, compress: bool = False,
+                     message: str = None):
+    """
+    Build the timestamped backup file path for a version, e.g.
+    "backup_20240101_120000_<version_id>.msgpack.zst", and create directory.
+    If message is given, its first 20 filename-safe characters are appended.
+
+    Returns:
+        Tuple of (timestamp, filepath)
+    """
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"backup_{timestamp}_{version_id}"
+    if message is not None:
+        clean_msg = UNSAFE_FILENAME_CHARS.sub("", message).rstrip()
+        filename += f"_{clean_msg[:20]}"
+
+    os.makedirs(directory, exist_ok=True)
+    return timestamp, os.path.join(directory, filename + backup_extension(fmt, compress))
+
+
+def reuse_existing_backup(index: dict, object_id, filepath) -> bool:
+    """
+    Link the backup that index already holds for object_id to filepath
+    instead of downloading the object again.
+    Entries whose backup can no longer be reused are dropped from index.
+
+    Returns:
+        True if the backup could be reused
+    """
+    if object_id not in index:
+        return False
+
+    try:
+        if not link_backup(index[object_id], filepath):
+            del index[object_id]
+            return False
+    except Exception as e:
+        print(f"   ⚠️  Could not reuse backup for {object_id}: {e}")
+        return False
+
+    print(f"   ♻️  Object unchanged, reused backup: {os.path.basename(filepath)}")
+    return True
+
+
+def parse_backup_args(description: str, default_format: str):
+    """
+    Parse the command line options shared by the backup scripts.
+
+    Returns:
+        argparse.Namespace with format, compress and indent
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--format", choices=list(BACKUP_FORMATS), default=default_format,
+        help="backup file format (msgpack is smaller/faster, json is human readable)",
+    )
+    parser.add_argument(
+        "--no-compress", action="store_true",
+        help="write uncompressed backups (easier to inspect/debug)",
+    )
+    parser.add_argument(
+        "--pretty", action="store_true",
+        help="indent JSON backups for human inspection (default: compact)",
+    )
+    args = parser.parse_args()
+    args.compress = not args.no_compress
+    args.indent = 2 if args.pretty else None
+    return args
+
+
+def load_backup_index(path) -> dict:
+    """
+    Load the {object_id: backup filepath} index saved by save_backup_index().
+    Entries whose backup file no longer exists are dropped.
+    An unreadable index is ignored (the backups are simply not reused).
+    """
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        index = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except ValueError as e:
+        print(f"⚠️  Ignoring unreadable backup index {path}: {e}")
+        return {}
+    if not isinstance(index, dict):
+        print(f"⚠️  Ignoring unreadable backup index {path}: not a JSON object")
+        return {}
+
+    return {
+        object_id: filepath
+        for object_id, filepath in index.items()
+        if os.path.exists(filepath)
+    }
+
+
+def save_backup_index(path, index: dict):
+    """
+    Save the {object_id: backup filepath} index for the next run.
+
+    The index is written to a temporary file first and then moved into place,
+    so a crash while writing never leaves a truncated index behind.
+    """
+    tmp_path = path + ".tmp"
+    write_json(tmp_path, index)
+    os.replace(tmp_path, path)
+
+
+def _full_extension(path) -> str:
+    """Return all extensions of path, e.g. ".msgpack.zst"."""
+    name = os.path.basename(path)
+    return name[name.find("."):] if "." in name else ""
+
+
+def link_backup(src, dst) -> bool:
+    """
+    Reuse an existing backup file for a new version by hard-linking it
+    (or copying it where hard links are not supported).
+
+    Returns:
+        False if src does not exist anymore or is in another format
+        than dst, True otherwise
+    """
+    if not os.path.exists(src):
+        return False
+    if _full_extension(src) != _full_extension(dst):
+        return False
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return True
@@ -1,20 +1,33 @@
 """
 Authentication module for Speckle.
-This module provides a reusable get_client() function for all other scripts.
+This module provides a reusable get_client() function for all other scripts,
+and get_http_session() for sending many GraphQL queries over one
+kept-alive HTTP connection pool.
 
 Usage:
-    from main import get_client
+    from main import get_client, get_http_session
     client = get_client()
+    result = get_http_session(client).execute(query, variable_values=variables)
 """
 
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
+from gql import Client
+from gql.transport.requests import RequestsHTTPTransport
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from specklepy.api.client import SpeckleClient
 
 
+HTTP_POOL_SIZE = 32
+
+
+@lru_cache(maxsize=1)
 def get_client() -> SpeckleClient:
     """
     Authenticate and return a SpeckleClient instance.
+    The client is created once and reused by later calls.
     
     Requires SPECKLE_TOKEN in environment or .env file.
     Optionally set SPECKLE_SERVER (defaults to app.speckle.systems).
@@ -36,6 +49,35 @@ def get_client() -> SpeckleClient:
     return client
 
 
+@lru_cache(maxsize=None)
+def get_http_session(client: SpeckleClient):
+    """
+    Return a connected GraphQL session for client's HTTP endpoint.
+
+    client.httpclient.execute() opens and closes a new requests.Session for
+    every query. This session stays connected (and is reused by later calls),
+    with a larger connection pool and retries, so queries share keep-alive
+    connections.
+    """
+    speckle_transport = client.httpclient.transport
+    transport = RequestsHTTPTransport(
+        url=speckle_transport.url,
+        headers=speckle_transport.headers,
+        verify=speckle_transport.verify,
+    )
+    session = Client(transport=transport).connect_sync()
+
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=Retry(total=3, backoff_factor=0.3),
+    )
+    transport.session.mount("https://", adapter)
+    transport.session.mount("http://", adapter)
+
+    return session
+
+
 if __name__ == "__main__":
     # Test authentication when running this script directly
     client = get_client()
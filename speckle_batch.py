@@ -0,0 +1,173 @@
+"""
+Batching helpers for Speckle object queries.
+This module provides functions to fetch several objects in a single GraphQL
+request, and to collect bursts of events from an asyncio.Queue and handle
+them in batches (finishing the queued ones on shutdown).
+
+Usage:
+    from speckle_batch import build_objects_query, split_objects_result
+    query, variables = build_objects_query(PROJECT_ID, object_ids)
+    result = client.httpclient.execute(query, variable_values=variables)
+    objects = split_objects_result(result, object_ids)  # {object_id: object}
+
+    worker = asyncio.create_task(batch_worker(queue, handle, tasks))
+    ...
+    await finish_batches(queue, worker, tasks)
+"""
+
+import asyncio
+import signal
+from gql import gql
+
+
+BATCH_MAX_SIZE = 10    # Max number of objects fetched in one request
+BATCH_WINDOW = 0.01    # Seconds to wait for more events before sending
+
+
+def _unique(object_ids):
+    """Return object_ids without duplicates, keeping their order."""
+    return list(dict.fromkeys(object_ids))
+
+
+def build_objects_query(project_id: str, object_ids, fields: str = "data"):
+    """
+    Build one GraphQL query that fetches all object_ids using aliases
+    (o0: object(id: $id0) {...} o1: object(id: $id1) {...} ...).
+    Only the given fields are requested (the backups only need "data").
+
+    Returns:
+        Tuple of (query document, variables)
+
+    Raises:
+        ValueError: if object_ids is empty (the query would have no fields)
+    """
+    object_ids = _unique(object_ids)
+    if not object_ids:
+        raise ValueError("build_objects_query() needs at least one object ID.")
+
+    params = "".join(f", $id{i}: String!" for i in range(len(object_ids)))
+    aliases = "\n".join(
+        f"o{i}: object(id: $id{i}) {{ {fields} }}" for i in range(len(object_ids))
+    )
+    query = gql(f"""
+    query GetObjects($projectId: String!{params}) {{
+        project(id: $projectId) {{
+            {aliases}
+        }}
+    }}
+    """)
+
+    variables = {"projectId": project_id}
+    for i, object_id in enumerate(object_ids):
+        variables[f"id{i}"] = object_id
+
+    return query, variables
+
+
+def split_objects_result(result: dict, object_ids) -> dict:
+    """
+    Split the result of build_objects_query() back into {object_id: object}.
+    """
+    project = result.get("project") or {}
+    return {
+        object_id: project.get(f"o{i}")
+        for i, object_id in enumerate(_unique(object_ids))
+    }
+
+
+async def collect_batch(queue: asyncio.Queue, max_size: int = BATCH_MAX_SIZE,
+                        window: float = BATCH_WINDOW) -> list:
+    """
+    Wait for the next item on queue, then keep collecting items until
+    max_size is reached or no new item arrives within window seconds.
+    """
+    loop = asyncio.get_running_loop()
+    batch = [await queue.get()]
+    deadline = loop.time() + window
+
+    while len(batch) < max_size:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+
+    return batch
+
+
+async def batch_worker(queue: asyncio.Queue, handle, tasks: set, max_concurrent: int = 1):
+    """
+    Drain queue in small batches (see collect_batch) and run handle(events)
+    for each batch as its own task, at most max_concurrent at a time.
+    While all slots are busy, new events keep queuing up into the next batch.
+
+    Running tasks are kept in tasks so they can be awaited on shutdown.
+    Stops once it reaches the None queued by finish_batches().
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def _run(events):
+        try:
+            await handle(events)
+        finally:
+            semaphore.release()
+
+    while True:
+        await semaphore.acquire()
+        events = await collect_batch(queue)
+        # Handle the events collected before the None, then stop
+        stop = None in events
+        events = [event for event in events if event is not None]
+        if events:
+            task = asyncio.create_task(_run(events))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        else:
+            semaphore.release()
+        if stop:
+            return
+
+
+async def finish_batches(queue: asyncio.Queue, worker: asyncio.Task, tasks: set):
+    """
+    Let batch_worker() handle the events still in queue, then wait until
+    all running batches are done.
+
+    The waiting is shielded: if it is cancelled (e.g. a second Ctrl+C),
+    the batches are not cancelled with it and this returns early.
+    """
+    pending = queue.qsize()
+    if pending:
+        print(f"⏳ Finishing {pending} queued event(s)...")
+    queue.put_nowait(None)
+
+    try:
+        await asyncio.shield(worker)
+        await asyncio.shield(asyncio.gather(*tasks, return_exceptions=True))
+    except asyncio.CancelledError:
+        print(f"⚠️  Stopped waiting for {len(tasks)} running batch(es).")
+
+
+async def stop_on_sigint(coro):
+    """
+    Run coro so that Ctrl+C only cancels it, like asyncio.run() does since
+    Python 3.11. On Python 3.10, asyncio.run() turns Ctrl+C into a
+    KeyboardInterrupt and cancels every task, including the backup worker,
+    so queued backups could not be finished on shutdown.
+
+    Usage:
+        asyncio.run(stop_on_sigint(main()))
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+
+    def on_sigint(signum, frame):
+        loop.call_soon_threadsafe(task.cancel)
+
+    previous = signal.signal(signal.SIGINT, on_sigint)
+    try:
+        return await coro
+    finally:
+        signal.signal(signal.SIGINT, previous)
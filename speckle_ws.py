@@ -0,0 +1,134 @@
+"""
+Shared WebSocket session for Speckle GraphQL subscriptions.
+This module provides a reusable get_session() function so that all
+subscriptions of a script are multiplexed over one WebSocket connection.
+
+Usage:
+    from speckle_ws import get_session, close_session
+    session = await get_session()
+    async for result in session.subscribe(query, variable_values=variables):
+        ...
+    await close_session()
+
+Use subscribe() instead of session.subscribe() to reconnect automatically
+(with exponential backoff) when the connection drops.
+"""
+
+import asyncio
+import os
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from gql import Client
+from gql.transport.exceptions import TransportClosed, TransportServerError
+from gql.transport.websockets import WebsocketsTransport
+from websockets.exceptions import ConnectionClosed
+
+
+KEEP_ALIVE_TIMEOUT = 60  # Seconds without a sign of life before the connection is considered dead
+MAX_RECONNECT_DELAY = 60  # Upper bound (seconds) for the reconnect backoff
+
+# Errors that mean the connection was lost (and may come back); anything else is raised.
+# TransportServerError is what every listener gets when KEEP_ALIVE_TIMEOUT expires;
+# TransportQueryError (rejected query or auth) is not part of it.
+CONNECTION_ERRORS = (
+    ConnectionClosed, TransportClosed, TransportServerError, OSError, asyncio.TimeoutError,
+)
+
+_client = None
+_session = None
+_lock = asyncio.Lock()
+
+
+def get_server_host() -> str:
+    """
+    Return the Speckle server host name (e.g. "app.speckle.systems").
+
+    SPECKLE_SERVER may be a bare host or a URL such as
+    "https://app.speckle.systems"; the scheme and path are dropped.
+    Defaults to app.speckle.systems.
+    """
+    load_dotenv()
+    server = os.environ.get("SPECKLE_SERVER", "app.speckle.systems").strip()
+
+    if "://" in server:
+        return urlparse(server).netloc
+    return server.rstrip("/")
+
+
+async def get_session():
+    """
+    Connect on first use and return the shared GraphQL session.
+    Later calls return the same session (and the same WebSocket).
+
+    Requires SPECKLE_TOKEN in environment or .env file.
+    Optionally set SPECKLE_SERVER (defaults to app.speckle.systems).
+    """
+    global _client, _session
+
+    async with _lock:
+        if _session is None:
+            server_host = get_server_host()
+            token = os.environ.get("SPECKLE_TOKEN")
+
+            if not token:
+                raise ValueError("Set SPECKLE_TOKEN in your .env file and re-run.")
+
+            transport = WebsocketsTransport(
+                url=f"wss://{server_host}/graphql",
+                init_payload={"Authorization": f"Bearer {token}"},
+                keep_alive_timeout=KEEP_ALIVE_TIMEOUT,
+            )
+            client = Client(transport=transport, fetch_schema_from_transport=False)
+            _session = await client.connect_async()
+            _client = client
+
+    return _session
+
+
+async def close_session(session=None):
+    """
+    Close the shared WebSocket connection, if it is open.
+
+    If session is given, the connection is only closed while it is still
+    the shared session (it may already have been replaced by a reconnect).
+    """
+    global _client, _session
+
+    async with _lock:
+        if session is not None and session is not _session:
+            return
+        if _client is not None:
+            client = _client
+            _client = None
+            _session = None
+            await client.close_async()
+
+
+async def subscribe(query, variable_values=None):
+    """
+    Yield the results of a subscription on the shared session, forever.
+
+    If the connection drops, the shared session is closed and reconnected
+    after 1, 2, 4, ... seconds (at most MAX_RECONNECT_DELAY). The delay is
+    reset as soon as a result is received. Only CONNECTION_ERRORS (including
+    a missed keep-alive) are retried; anything else (rejected query or auth,
+    missing token, ...) is raised to the caller.
+    """
+    attempt = 0
+
+    while True:
+        session = None
+        try:
+            session = await get_session()
+            async for result in session.subscribe(query, variable_values=variable_values):
+                attempt = 0
+                yield result
+            return
+        except CONNECTION_ERRORS as e:
+            delay = min(MAX_RECONNECT_DELAY, 2 ** attempt)
+            attempt += 1
+            print(f"⚠️  Connection lost ({e!r}), reconnecting in {delay}s...")
+            # Only close the session that failed; another subscriber may have reconnected already
+            if session is not None:
+                await close_session(session)
+            await asyncio.sleep(delay)